@@ -5,16 +5,25 @@ Uses Groq API (Llama 3.3 70B) to extract structured data.
 """
 
 import os
-import json
+import re
+import orjson
+import hashlib
 import time
+import asyncio
+import argparse
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Dict, Any
+from typing import Dict, Any, Iterator, List, Optional, Union, get_args, get_origin
 from dotenv import load_dotenv
+from pydantic import BaseModel, Field, ValidationError, model_validator
 
 # specific imports
 from docx import Document
 from neo4j import GraphDatabase
-from groq import Groq, RateLimitError
+import httpx
+from groq import AsyncGroq, APIConnectionError, APITimeoutError, InternalServerError, RateLimitError
+from tenacity import retry, retry_if_exception_type, stop_after_attempt, wait_exponential_jitter
 
 # Load environment variables
 load_dotenv()
@@ -25,10 +34,325 @@ NEO4J_URI = os.getenv('NEO4J_URI', 'bolt://localhost:7687')
 NEO4J_USER = os.getenv('NEO4J_USER', 'neo4j')
 NEO4J_PASSWORD = os.getenv('NEO4J_PASSWORD')
 
-# Constants for Rate Limiting (Groq Free Tier)
-# Groq free tier often limits Total Tokens Per Minute (TPM). 
-# A 30s delay is conservative to avoid 429 errors on large docs.
-DELAY_BETWEEN_DOCS_SECONDS = 30 
+GROQ_MODEL = "llama-3.3-70b-versatile"
+
+# Retry policy for 429s, connection errors, timeouts and 5xx: exponential backoff
+# with jitter unless Groq sends retry-after
+RETRYABLE_ERRORS = (RateLimitError, APIConnectionError, APITimeoutError, InternalServerError)
+RATE_LIMIT_MAX_ATTEMPTS = 6
+RATE_LIMIT_MAX_WAIT_SECONDS = 120
+_rate_limit_backoff = wait_exponential_jitter(initial=5, max=RATE_LIMIT_MAX_WAIT_SECONDS)
+
+# Groq HTTP connection pool
+HTTP_MAX_CONNECTIONS = 32
+HTTP_MAX_KEEPALIVE = 16
+HTTP_TIMEOUT_SECONDS = 60
+
+# Cheap pre-filter: a small model decides whether a document is worth a full extraction
+RELEVANCE_MODEL = "llama-3.1-8b-instant"
+RELEVANCE_SAMPLE_CHARS = 4_000
+RELEVANCE_PROMPT = (
+    "Does the document below contain financial information about specific clients "
+    "(e.g. income, assets, pensions, investments, dependants, goals)? Answer only y or n.\n\n"
+)
+
+# Extraction cache: responses keyed by sha256(model + prompts), reused until they expire
+CACHE_DIR = Path(".groq_cache")
+CACHE_TTL_SECONDS = 7 * 24 * 3600
+
+# Rate Limiting (Groq Free Tier)
+# Groq free tier often limits Total Tokens Per Minute (TPM).
+# Instead of a blanket sleep, we read the x-ratelimit-* response headers
+# and only wait when the next request would exceed the remaining budget.
+CHARS_PER_TOKEN = 4
+
+# Cap on document text sent to the model (prefill cost and TPM scale with length)
+MAX_DOC_CHARS = 40_000
+
+# Consecutive documents whose combined length fits this budget share one Groq request
+BATCH_CHAR_BUDGET = 20_000
+
+# Background threads prefetching docx text while Groq calls are in flight
+READ_WORKERS = 2
+READ_PREFETCH = 2 * READ_WORKERS
+
+# Number of document batches in flight at once (bounded by the rate-limit envelope)
+MAX_CONCURRENT_DOCS = 4
+
+
+def clean_props(d: Dict[str, Any]) -> Dict[str, Any]:
+    """Drop null values so they aren't shipped to (or wipe properties in) Neo4j"""
+    return {k: v for k, v in d.items() if v is not None}
+
+
+# Extraction output models. llama-3.3-70b-versatile doesn't support Groq's json_schema
+# structured outputs, so a compact outline of these goes in the prompt (JSON mode) and
+# responses are validated locally, which also fills in defaults for missing fields.
+def parse_number(value: Any, kind: type) -> Optional[float]:
+    """Leniently read model output like 45, "50,000" or "£50000"; None if it isn't a plain number"""
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, str):
+        cleaned = re.sub(r'[£$€,%\s]', '', value)
+        if not re.fullmatch(r'-?\d+(?:\.\d+)?', cleaned):
+            return None
+        value = float(cleaned)
+    if not isinstance(value, (int, float)):
+        return None
+    return round(value) if kind is int else float(value)
+
+
+def lenient_value(annotation, value: Any) -> Any:
+    """Coerce one field value towards its annotation; None (the field default) if it can't be"""
+    if get_origin(annotation) is Union:
+        annotation = next(a for a in get_args(annotation) if a is not type(None))
+    if annotation in (int, float):
+        return parse_number(value, annotation)
+    if annotation is str:
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            return str(value)
+        return value if isinstance(value, str) else None
+    if get_origin(annotation) is list:
+        if not isinstance(value, list):
+            return None
+        item = get_args(annotation)[0]
+        if isinstance(item, type) and issubclass(item, BaseModel):
+            return [v for v in value if isinstance(v, dict)]
+        return value
+    if isinstance(annotation, type) and issubclass(annotation, BaseModel):
+        return value if isinstance(value, dict) else None
+    return value
+
+
+class ExtractionModel(BaseModel):
+    """Base for extraction models: nulls and unparseable values fall back to the field's default,
+    so one malformed field never throws away the whole document"""
+
+    @model_validator(mode='before')
+    @classmethod
+    def _lenient(cls, data):
+        if not isinstance(data, dict):
+            return data
+        coerced = {}
+        for name, value in data.items():
+            field = cls.model_fields.get(name)
+            coerced[name] = lenient_value(field.annotation, value) if field else value
+        return clean_props(coerced)
+
+
+class Client(ExtractionModel):
+    name: Optional[str] = Field(None, description="Full Name")
+    dob: Optional[str] = Field(None, description="DD/MM/YYYY or null")
+    age: Optional[int] = None
+    occupation: Optional[str] = None
+    employer: Optional[str] = None
+    income: Optional[float] = None
+    health_notes: Optional[str] = None
+    marital_status: Optional[str] = None
+
+
+class Dependant(ExtractionModel):
+    name: Optional[str] = None
+    age: Optional[int] = None
+    school_type: Optional[str] = None
+    notes: Optional[str] = None
+
+
+class Property(ExtractionModel):
+    type: Optional[str] = None
+    value: Optional[float] = None
+    address: Optional[str] = None
+    mortgage_amount: Optional[float] = None
+    mortgage_lender: Optional[str] = None
+    mortgage_rate: Optional[float] = None
+    mortgage_end_date: Optional[str] = None
+
+
+class Pension(ExtractionModel):
+    type: Optional[str] = None
+    provider: Optional[str] = None
+    value: Optional[float] = None
+    contribution_amount: Optional[float] = None
+    contribution_frequency: Optional[str] = None
+    owner: Optional[str] = None
+
+
+class Investment(ExtractionModel):
+    type: Optional[str] = None
+    value: Optional[float] = None
+    contribution_amount: Optional[float] = None
+    allocation: Optional[str] = None
+    owner: Optional[str] = None
+
+
+class Assets(ExtractionModel):
+    properties: List[Property] = []
+    pensions: List[Pension] = []
+    investments: List[Investment] = []
+
+
+class Liability(ExtractionModel):
+    type: Optional[str] = None
+    amount: Optional[float] = None
+    lender: Optional[str] = None
+    rate: Optional[float] = None
+
+
+class Protection(ExtractionModel):
+    type: Optional[str] = None
+    provider: Optional[str] = None
+    cover_amount: Optional[float] = None
+    monthly_premium: Optional[float] = None
+    status: Optional[str] = None
+
+
+class RetirementGoal(ExtractionModel):
+    target_age: Optional[int] = None
+    target_income: Optional[float] = None
+    lifestyle_notes: Optional[str] = None
+
+
+class EducationGoal(ExtractionModel):
+    target_amount_per_child: Optional[float] = None
+    notes: Optional[str] = None
+
+
+class OtherGoal(ExtractionModel):
+    description: Optional[str] = None
+    target_date: Optional[str] = None
+    estimated_cost: Optional[float] = None
+
+
+class Goals(ExtractionModel):
+    retirement: Optional[RetirementGoal] = None
+    education: Optional[EducationGoal] = None
+    other_goals: List[OtherGoal] = []
+
+
+class TaxInfo(ExtractionModel):
+    total_household_income: Optional[float] = None
+    estimated_iht_liability: Optional[float] = None
+    tax_bracket: Optional[str] = None
+
+
+class Recommendation(ExtractionModel):
+    category: Optional[str] = None
+    priority: Optional[str] = None
+    description: Optional[str] = None
+
+
+class ExtractionOutput(ExtractionModel):
+    clients: List[Client] = []
+    dependants: List[Dependant] = []
+    assets: Assets = Assets()
+    liabilities: List[Liability] = []
+    protection: List[Protection] = []
+    goals: Goals = Goals()
+    tax_info: TaxInfo = TaxInfo()
+    recommendations: List[Recommendation] = []
+    adviser: Optional[str] = None
+    document_type: Optional[str] = None
+
+
+class BatchExtractionOutput(ExtractionModel):
+    documents: List[ExtractionOutput]
+
+
+def schema_outline(annotation) -> Any:
+    """Compact example structure for a type, e.g. {"age": "number or null"}"""
+    if get_origin(annotation) is Union:
+        inner = schema_outline(next(a for a in get_args(annotation) if a is not type(None)))
+        return f"{inner} or null" if isinstance(inner, str) else inner
+    if get_origin(annotation) is list:
+        return [schema_outline(get_args(annotation)[0])]
+    if isinstance(annotation, type) and issubclass(annotation, BaseModel):
+        return {name: field.description or schema_outline(field.annotation)
+                for name, field in annotation.model_fields.items()}
+    return {str: "string", int: "number", float: "number"}[annotation]
+
+
+EXTRACTION_SCHEMA = orjson.dumps(schema_outline(ExtractionOutput)).decode()
+
+# Prompts are built once at import time; the identical prefix across docs
+# is eligible for provider-side prompt caching.
+SYSTEM_PROMPT = "You are a specialized financial data extraction AI. You output ONLY valid JSON."
+
+USER_PROMPT_PREFIX = """
+Analyze this financial planning document and extract its structured information.
+
+Output ONLY valid JSON with this structure:
+""" + EXTRACTION_SCHEMA + """
+
+DOCUMENT TEXT:
+"""
+
+# Several short documents packed into one request, one result per document under "documents"
+BATCH_PROMPT_PREFIX = """
+Analyze each of the financial planning documents below independently and extract its structured information.
+Output ONLY valid JSON of the form {"documents": [...]}, with exactly one entry per document, in the same order as the documents.
+Each entry has this structure:
+""" + EXTRACTION_SCHEMA + """
+
+DOCUMENTS:
+
+"""
+
+
+def retry_after_seconds(error: RateLimitError) -> Optional[float]:
+    """Groq's retry-after header, capped so a daily-limit 429 can't stall the run for hours"""
+    retry_after = error.response.headers.get('retry-after')
+    if not retry_after:
+        return None
+    return min(float(retry_after), RATE_LIMIT_MAX_WAIT_SECONDS)
+
+
+def wait_retry_after(retry_state) -> float:
+    """Tenacity wait: honour Groq's retry-after header on 429s, else exponential backoff with jitter"""
+    error = retry_state.outcome.exception()
+    if isinstance(error, RateLimitError):
+        retry_after = retry_after_seconds(error)
+        if retry_after is not None:
+            return retry_after
+    return _rate_limit_backoff(retry_state)
+
+
+# SDK retries are off, so every Groq call goes through this instead
+groq_retry = retry(
+    retry=retry_if_exception_type(RETRYABLE_ERRORS),
+    wait=wait_retry_after,
+    stop=stop_after_attempt(RATE_LIMIT_MAX_ATTEMPTS),
+    reraise=True
+)
+
+
+def unique_props(items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Clean each entity dict and drop exact duplicates, preserving order"""
+    seen = set()
+    rows = []
+    for item in items:
+        props = clean_props(item)
+        key = orjson.dumps(props, option=orjson.OPT_SORT_KEYS)
+        if key not in seen:
+            seen.add(key)
+            rows.append(props)
+    return rows
+
+
+def has_clients(entities: Dict[str, Any]) -> bool:
+    """True if an extraction found at least one client; anything less counts as a failed extraction"""
+    return bool(entities and entities.get('clients'))
+
+
+def document_name(filepath: Path, root: Path) -> str:
+    """Document identity: path relative to the documents root, without the .docx suffix"""
+    return filepath.relative_to(root).with_suffix('').as_posix()
+
+
+def parse_reset_duration(value: str) -> float:
+    """Convert Groq reset strings like '1m26.4s' or '340ms' into seconds"""
+    units = {'h': 3600, 'm': 60, 's': 1, 'ms': 0.001}
+    parts = re.findall(r'(\d+(?:\.\d+)?)(ms|h|m|s)', value or '')
+    return sum(float(num) * units[unit] for num, unit in parts)
 
 class Neo4jGraphBuilder:
     """Builds Neo4j knowledge graph from financial documents using Groq"""
@@ -39,172 +363,230 @@ class Neo4jGraphBuilder:
         if not GROQ_API_KEY:
             raise ValueError("GROQ_API_KEY is not set in environment variables.")
             
-        self.client = Groq(api_key=GROQ_API_KEY)
+        # Pooled HTTP/2 connections: concurrent requests share TLS sessions instead of re-handshaking
+        http_client = httpx.AsyncClient(
+            http2=True,
+            limits=httpx.Limits(max_connections=HTTP_MAX_CONNECTIONS,
+                                max_keepalive_connections=HTTP_MAX_KEEPALIVE),
+            timeout=HTTP_TIMEOUT_SECONDS
+        )
+        # SDK retries are off: rate limits and transient errors are retried by groq_retry
+        self.aclient = AsyncGroq(api_key=GROQ_API_KEY, http_client=http_client, max_retries=0)
+
+        # Token budget as last reported by Groq (None until the first response)
+        self._tokens_limit = None
+        self._tokens_remaining = None
+        self._reset_at = 0.0
+
+        self.cache_dir = CACHE_DIR
+        self.cache_dir.mkdir(exist_ok=True)
         
-    def close(self):
+    async def close(self):
+        await self.aclient.close()
         self.driver.close()
     
     def read_docx(self, filepath: str) -> str:
-        """Extract text from Word document"""
+        """Extract text from Word document, truncated to MAX_DOC_CHARS"""
         try:
             doc = Document(filepath)
-            return '\n'.join([paragraph.text for paragraph in doc.paragraphs])
+            paragraphs = []
+            char_total = 0
+            for paragraph in doc.paragraphs:
+                text = paragraph.text
+                if not text.strip():
+                    continue
+                if char_total + len(text) > MAX_DOC_CHARS:
+                    print(f"   ⚠️ {Path(filepath).name} exceeds {MAX_DOC_CHARS} chars, truncating")
+                    # Keep the part of the overflowing paragraph that still fits
+                    remaining = MAX_DOC_CHARS - char_total
+                    if remaining > 0:
+                        paragraphs.append(text[:remaining])
+                    break
+                paragraphs.append(text)
+                char_total += len(text) + 1
+            return '\n'.join(paragraphs)
         except Exception as e:
             print(f"Error reading file {filepath}: {e}")
             return ""
+
+    async def _wait_for_token_budget(self, prompt: str):
+        """Sleep until the TPM window resets if the prompt would exceed the remaining budget"""
+        if self._tokens_remaining is None:
+            return
+
+        estimate = len(prompt) // CHARS_PER_TOKEN
+        if estimate > self._tokens_remaining:
+            wait = max(0.0, self._reset_at - time.monotonic())
+            if wait > 0:
+                print(f"   zzz Need ~{estimate} tokens, {self._tokens_remaining} left. Sleeping {wait:.1f}s...")
+                await asyncio.sleep(wait)
+
+            # The window has reset since the last response: start again from the full
+            # per-minute limit (or stop tracking until a response reports one)
+            self._tokens_remaining = self._tokens_limit
+            if self._tokens_remaining is None:
+                return
+
+        # Reserve the estimate so concurrent requests don't all spend the same budget
+        self._tokens_remaining -= estimate
+
+    def _update_token_budget(self, headers):
+        """Record the remaining TPM budget from Groq's rate limit headers"""
+        limit = headers.get('x-ratelimit-limit-tokens')
+        remaining = headers.get('x-ratelimit-remaining-tokens')
+        reset = headers.get('x-ratelimit-reset-tokens')
+
+        if limit is not None:
+            self._tokens_limit = int(float(limit))
+        if remaining is not None:
+            self._tokens_remaining = int(float(remaining))
+        if reset is not None:
+            self._reset_at = time.monotonic() + parse_reset_duration(reset)
     
-    def extract_entities_with_groq(self, document_text: str) -> Dict[str, Any]:
-        """Use Groq (Llama 3.3) to extract structured entities"""
-        
-        # Llama 3 prompt optimized for JSON extraction
-        system_prompt = "You are a specialized financial data extraction AI. You output ONLY valid JSON."
-        
-        user_prompt = f"""
-Analyze this financial planning document and extract structured information into the specific JSON format below.
-
-Output ONLY valid JSON. Do not include markdown formatting like ```json ... ```.
-
-REQUIRED JSON STRUCTURE:
-{{
-  "clients": [
-    {{
-      "name": "Full Name",
-      "dob": "DD/MM/YYYY or null",
-      "age": number or null,
-      "occupation": "string or null",
-      "employer": "string or null",
-      "income": number or null,
-      "health_notes": "string or null",
-      "marital_status": "string or null"
-    }}
-  ],
-  "dependants": [
-    {{
-      "name": "string",
-      "age": number or null,
-      "school_type": "string or null",
-      "notes": "string or null"
-    }}
-  ],
-  "assets": {{
-    "properties": [
-      {{
-        "type": "string",
-        "value": number or null,
-        "address": "string or null",
-        "mortgage_amount": number or null,
-        "mortgage_lender": "string or null",
-        "mortgage_rate": number or null,
-        "mortgage_end_date": "string or null"
-      }}
-    ],
-    "pensions": [
-      {{
-        "type": "string",
-        "provider": "string or null",
-        "value": number or null,
-        "contribution_amount": number or null,
-        "contribution_frequency": "string or null",
-        "owner": "string"
-      }}
-    ],
-    "investments": [
-      {{
-        "type": "string",
-        "value": number or null,
-        "contribution_amount": number or null,
-        "allocation": "string or null",
-        "owner": "string"
-      }}
-    ]
-  }},
-  "liabilities": [
-    {{
-      "type": "string",
-      "amount": number or null,
-      "lender": "string or null",
-      "rate": number or null
-    }}
-  ],
-  "protection": [
-    {{
-      "type": "string",
-      "provider": "string or null",
-      "cover_amount": number or null,
-      "monthly_premium": number or null,
-      "status": "string"
-    }}
-  ],
-  "goals": {{
-    "retirement": {{
-      "target_age": number or null,
-      "target_income": number or null,
-      "lifestyle_notes": "string or null"
-    }},
-    "education": {{
-      "target_amount_per_child": number or null,
-      "notes": "string or null"
-    }},
-    "other_goals": [
-      {{
-        "description": "string",
-        "target_date": "string or null",
-        "estimated_cost": number or null
-      }}
-    ]
-  }},
-  "tax_info": {{
-    "total_household_income": number or null,
-    "estimated_iht_liability": number or null,
-    "tax_bracket": "string or null"
-  }},
-  "recommendations": [
-    {{
-      "category": "string",
-      "priority": "string",
-      "description": "string"
-    }}
-  ],
-  "adviser": "string or null",
-  "document_type": "string"
-}}
+    def _cache_path(self, model: str, *prompts: str) -> Path:
+        """Cache file for a given model + prompt combination"""
+        key = hashlib.sha256("\0".join((model,) + prompts).encode()).hexdigest()
+        return self.cache_dir / f"{key}.json"
 
-DOCUMENT TEXT:
-{document_text}
-"""
-        
+    def _read_cache(self, cache_path: Path):
+        """Return the cached bytes if present and fresh, else None (a miss)"""
+        try:
+            if time.time() - cache_path.stat().st_mtime >= CACHE_TTL_SECONDS:
+                return None
+            return cache_path.read_bytes()
+        except OSError:
+            return None
+
+    def _write_cache(self, cache_path: Path, data: bytes):
+        """Write via a temp file + os.replace so an interrupted run never leaves a truncated entry"""
+        tmp_path = cache_path.with_suffix(f".{os.getpid()}.tmp")
         try:
-            completion = self.client.chat.completions.create(
-                model="llama-3.3-70b-versatile",
+            tmp_path.write_bytes(data)
+            os.replace(tmp_path, cache_path)
+        except OSError as e:
+            # The cache is only an optimisation; never lose a good result over it
+            print(f"   ⚠️ Could not write cache entry {cache_path.name}: {e}")
+
+    @groq_retry
+    async def _create_completion(self, user_prompt: str):
+        """Issue the raw Groq request, retried with backoff on rate limits and transient errors"""
+        await self._wait_for_token_budget(SYSTEM_PROMPT + user_prompt)
+
+        try:
+            response = await self.aclient.chat.completions.with_raw_response.create(
+                model=GROQ_MODEL,
                 messages=[
-                    {"role": "system", "content": system_prompt},
+                    {"role": "system", "content": SYSTEM_PROMPT},
                     {"role": "user", "content": user_prompt}
                 ],
                 temperature=0,
-                # JSON mode ensures valid structure
-                response_format={"type": "json_object"} 
+                # JSON mode ensures valid JSON; the structure is checked locally
+                response_format={"type": "json_object"}
             )
-            
-            json_text = completion.choices[0].message.content
-            return json.loads(json_text)
+        except RateLimitError as e:
+            print(f"⚠️ Groq Rate Limit Hit, backing off: {e}")
+            # Force concurrent calls to wait for the window to reset too
+            self._tokens_remaining = 0
+            retry_after = retry_after_seconds(e)
+            if retry_after is not None:
+                self._reset_at = time.monotonic() + retry_after
+            raise
 
+        self._update_token_budget(response.headers)
+        return response
+
+    async def _complete_json(self, user_prompt: str, output_model: type,
+                             ignore_cache: bool = False) -> Dict[str, Any]:
+        """Send one JSON-mode request to Groq, validated against output_model and disk-cached"""
+        # Short-circuit on an identical, still-fresh previous extraction
+        cache_path = self._cache_path(GROQ_MODEL, SYSTEM_PROMPT, user_prompt)
+
+        try:
+            cached = None if ignore_cache else self._read_cache(cache_path)
+            if cached is not None:
+                try:
+                    entities = output_model.model_validate_json(cached).model_dump()
+                    print("   ↳ Using cached extraction")
+                    return entities
+                except ValidationError:
+                    pass  # Truncated or outdated entry: treat as a miss
+
+            response = await self._create_completion(user_prompt)
+
+            # No streaming: Groq doesn't support it together with a response_format
+            completion = await response.parse()
+            json_bytes = completion.choices[0].message.content.encode()
+
+            entities = output_model.model_validate_json(json_bytes).model_dump()
+            self._write_cache(cache_path, json_bytes)
+            return entities
+
+        except ValidationError as e:
+            print(f"Extraction did not match the expected structure: {e}")
+            return {}
         except RateLimitError as e:
-            print(f"⚠️ Groq Rate Limit Hit: {e}")
-            print("   (You may need to increase the DELAY_BETWEEN_DOCS_SECONDS constant)")
+            print(f"⚠️ Groq Rate Limit Hit, giving up after {RATE_LIMIT_MAX_ATTEMPTS} attempts: {e}")
+            return {}
+        except (APIConnectionError, InternalServerError) as e:
+            print(f"⚠️ Groq request failed, giving up after {RATE_LIMIT_MAX_ATTEMPTS} attempts: {e}")
             return {}
         except Exception as e:
             print(f"Error extracting entities: {e}")
             return {}
+
+    async def _is_relevant(self, document_text: str, ignore_cache: bool = False) -> bool:
+        """Ask the small model whether the document holds client financial info (fails open)"""
+        sample = document_text[:RELEVANCE_SAMPLE_CHARS]
+
+        # Cached like extractions, so fully cached re-runs make no requests at all
+        cache_path = self._cache_path(RELEVANCE_MODEL, RELEVANCE_PROMPT, sample)
+        cached = None if ignore_cache else self._read_cache(cache_path)
+        if cached in (b'y', b'n'):
+            return cached == b'y'
+
+        try:
+            completion = await self._create_relevance_completion(sample)
+            answer = (completion.choices[0].message.content or "").strip().lower()
+            relevant = not answer.startswith('n')
+            self._write_cache(cache_path, b'y' if relevant else b'n')
+            return relevant
+        except Exception as e:
+            print(f"   ⚠️ Relevance check failed, extracting anyway: {e}")
+            return True
+
+    @groq_retry
+    async def _create_relevance_completion(self, sample: str):
+        """Issue the one-token relevance request, retried like extraction requests"""
+        return await self.aclient.chat.completions.create(
+            model=RELEVANCE_MODEL,
+            messages=[{"role": "user", "content": RELEVANCE_PROMPT + sample}],
+            temperature=0,
+            max_tokens=1
+        )
+
+    async def extract_entities_with_groq(self, document_text: str, ignore_cache: bool = False) -> Dict[str, Any]:
+        """Use Groq (Llama 3.3) to extract structured entities"""
+        return await self._complete_json(USER_PROMPT_PREFIX + document_text, ExtractionOutput, ignore_cache)
+
+    async def extract_entities_batch(self, document_texts: List[str], ignore_cache: bool = False) -> List[Dict[str, Any]]:
+        """Extract entities for several documents in one request, one dict per document"""
+        sections = [f"--- DOC {i} ---\n{text}" for i, text in enumerate(document_texts, 1)]
+        user_prompt = BATCH_PROMPT_PREFIX + "\n\n".join(sections)
+
+        result = await self._complete_json(user_prompt, BatchExtractionOutput, ignore_cache)
+        return result.get('documents', [])
     
     def create_constraints(self):
-        """Create uniqueness constraints in Neo4j"""
+        """Create uniqueness constraints and lookup indexes in Neo4j"""
         constraints = [
             "CREATE CONSTRAINT client_name IF NOT EXISTS FOR (c:Client) REQUIRE c.name IS UNIQUE",
             "CREATE CONSTRAINT dependant_id IF NOT EXISTS FOR (d:Dependant) REQUIRE d.id IS UNIQUE",
             "CREATE CONSTRAINT property_id IF NOT EXISTS FOR (p:Property) REQUIRE p.id IS UNIQUE",
             "CREATE CONSTRAINT pension_id IF NOT EXISTS FOR (p:Pension) REQUIRE p.id IS UNIQUE",
             "CREATE CONSTRAINT investment_id IF NOT EXISTS FOR (i:Investment) REQUIRE i.id IS UNIQUE",
-            "CREATE CONSTRAINT adviser_name IF NOT EXISTS FOR (a:Adviser) REQUIRE a.name IS UNIQUE"
+            "CREATE CONSTRAINT adviser_name IF NOT EXISTS FOR (a:Adviser) REQUIRE a.name IS UNIQUE",
+            "CREATE CONSTRAINT goal_id IF NOT EXISTS FOR (g:Goal) REQUIRE g.id IS UNIQUE",
+            "CREATE CONSTRAINT document_name IF NOT EXISTS FOR (d:Document) REQUIRE d.name IS UNIQUE"
         ]
         
         with self.driver.session() as session:
@@ -214,143 +596,301 @@ DOCUMENT TEXT:
                 except Exception:
                     pass
     
-    def build_graph_from_entities(self, entities: Dict[str, Any], document_name: str):
-        """Build Neo4j graph from extracted entities"""
-        # (This logic remains standard, condensed for brevity but fully functional)
-        if not entities: return
+    def build_graph_from_entities(self, session, entities: Dict[str, Any], document_name: str):
+        """Build Neo4j graph from extracted entities in a single write transaction"""
+        if not has_clients(entities): return
+
+        session.execute_write(self._build_tx, entities, document_name)
+
+    def _build_tx(self, tx, entities: Dict[str, Any], document_name: str):
+        """Transaction function: the whole document in two statements (two Bolt round-trips)"""
+        adviser = entities.get('adviser')
+
+        # Clients
+        clients = entities.get('clients', [])
+        if not clients: return
+
+        # Blank names are normalised once so both statements use the same Client key
+        primary_client_name = (clients[0].get('name') or '').strip() or f"Unknown_{document_name}"
+
+        client_rows = []
+        for props in unique_props(clients):
+            props['source_document'] = document_name
+            props['name'] = (props.get('name') or '').strip() or primary_client_name
+            client_rows.append({"name": props['name'], "props": props})
+
+        # 1. Document marker + Clients + Adviser. Ingestion is tracked on its own
+        # Document node since Client.source_document is overwritten by later docs.
+        tx.run("""
+            MERGE (doc:Document {name: $document})
+            SET doc.status = 'ingested'
+            WITH doc
+            UNWIND $rows AS r
+            MERGE (c:Client {name: r.name})
+            SET c += r.props
+            WITH c
+            WHERE $adviser IS NOT NULL
+            MERGE (a:Adviser {name: $adviser})
+            MERGE (a)-[:ADVISES]->(c)
+        """, document=document_name, rows=client_rows, adviser=adviser)
+
+        # Dependants
+        dep_rows = [
+            {"id": f"{primary_client_name}_dep_{idx}", "props": dep}
+            for idx, dep in enumerate(unique_props(entities.get('dependants', [])))
+        ]
+
+        # Assets (Properties, Pensions, Investments)
+        assets = entities.get('assets') or {}
+
+        prop_rows = [
+            {"id": f"{primary_client_name}_prop_{idx}", "props": prop}
+            for idx, prop in enumerate(unique_props(assets.get('properties', [])))
+        ]
+
+        pen_rows = []
+        for idx, pen in enumerate(unique_props(assets.get('pensions', []))):
+            owner = pen.get('owner') or primary_client_name
+            pen_rows.append({"id": f"{owner}_pen_{idx}", "props": pen, "owner": owner})
+
+        inv_rows = []
+        for idx, inv in enumerate(unique_props(assets.get('investments', []))):
+            owner = inv.get('owner') or primary_client_name
+            inv_rows.append({"id": f"{owner}_inv_{idx}", "props": inv, "owner": owner})
 
+        # Goals
+        goals = entities.get('goals') or {}
+        goal_rows = []
+        retirement = clean_props(goals.get('retirement') or {})
+        if retirement:
+            goal_rows.append({"id": f"{primary_client_name}_ret_goal", "props": retirement})
+
+        # 2. Everything hanging off the clients. The Python driver waits for each
+        # statement's RUN response, so fewer statements is what saves round-trips.
+        # Dependants, properties and goals resolve the primary client once.
+        tx.run("""
+            MATCH (c:Client {name: $name})
+            CALL {
+                WITH c
+                UNWIND $deps AS r
+                MERGE (d:Dependant {id: r.id})
+                SET d += r.props
+                MERGE (c)-[:PARENT_OF]->(d)
+            }
+            CALL {
+                WITH c
+                UNWIND $props AS r
+                MERGE (p:Property {id: r.id})
+                SET p += r.props
+                MERGE (c)-[:OWNS]->(p)
+            }
+            CALL {
+                WITH c
+                UNWIND $goals AS r
+                MERGE (g:Goal {id: r.id})
+                SET g.type='Retirement', g += r.props
+                MERGE (c)-[:HAS_GOAL]->(g)
+            }
+            CALL {
+                UNWIND $pensions AS r
+                MERGE (o:Client {name: r.owner})
+                MERGE (p:Pension {id: r.id})
+                SET p += r.props
+                MERGE (o)-[:HAS_ACCOUNT]->(p)
+            }
+            CALL {
+                UNWIND $investments AS r
+                MERGE (o:Client {name: r.owner})
+                MERGE (i:Investment {id: r.id})
+                SET i += r.props
+                MERGE (o)-[:HAS_ACCOUNT]->(i)
+            }
+        """, name=primary_client_name, deps=dep_rows, props=prop_rows, goals=goal_rows,
+             pensions=pen_rows, investments=inv_rows)
+
+    async def _process_batch(self, batch: List[tuple], documents_path: Path,
+                             session, write_lock: asyncio.Lock, ignore_cache: bool = False) -> tuple:
+        """Extract and graph a batch of (filepath, label, text). Returns (successful, skipped)."""
+        for filepath, label, text in batch:
+            print(f"\n{label} Processing: {filepath.name} ({len(text)} chars)")
+
+        # 1. Pre-filter with the small model so boilerplate never reaches the 70B one
+        relevant = await asyncio.gather(*(self._is_relevant(text, ignore_cache) for _, _, text in batch))
+        for (_, label, _), keep in zip(batch, relevant):
+            if not keep:
+                print(f"   {label} ↷ No client financial info, skipping")
+        skipped = len(batch) - sum(relevant)
+        if skipped:
+            irrelevant = [document_name(filepath, documents_path) for (filepath, _, _), keep in zip(batch, relevant) if not keep]
+            try:
+                async with write_lock:
+                    await asyncio.to_thread(self.mark_documents, session, irrelevant, 'irrelevant')
+            except Exception as e:
+                print(f"   ⚠️ Could not record skipped documents: {e}")
+        batch = [doc for doc, keep in zip(batch, relevant) if keep]
+        if not batch:
+            return 0, skipped
+
+        # 2. Extract (one request for the whole batch when it holds several docs)
+        if len(batch) == 1:
+            print(f"   {batch[0][1]} ↳ Extracting with Groq...")
+            results = [await self.extract_entities_with_groq(batch[0][2], ignore_cache)]
+        else:
+            labels = ", ".join(label for _, label, _ in batch)
+            print(f"   {labels} ↳ Extracting {len(batch)} docs with one Groq request...")
+            results = await self.extract_entities_batch([text for _, _, text in batch], ignore_cache)
+            if len(results) != len(batch):
+                print(f"   {labels} ⚠️ Got {len(results)} results for {len(batch)} docs, extracting individually")
+                results = [await self.extract_entities_with_groq(text, ignore_cache) for _, _, text in batch]
+
+        # 3. Build Graph (sessions aren't thread-safe, so writes take turns on the shared one)
+        successful = 0
+        for (filepath, label, _), entities in zip(batch, results):
+            if not has_clients(entities):
+                # Validation fills in defaults, so an empty reply shows up as "no clients"
+                print(f"   {label} ❌ Extraction failed (no clients extracted)")
+                continue
+            try:
+                async with write_lock:
+                    await asyncio.to_thread(self.build_graph_from_entities, session, entities,
+                                            document_name(filepath, documents_path))
+            except Exception as e:
+                # One bad write shouldn't sink the rest of the batch
+                print(f"   {label} ❌ Graph write failed: {e}")
+                continue
+            print(f"   {label} ✓ Graph updated")
+            successful += 1
+        return successful, skipped
+
+    async def _read_batches(self, docx_files: Iterator[Path], total: int,
+                            pool: ThreadPoolExecutor, unreadable: List[Path]):
+        """Yield consecutive (filepath, label, text) batches fitting BATCH_CHAR_BUDGET as reads complete"""
+        # Keep a small window of reads in flight on the pool so docx parsing runs
+        # behind in-flight Groq calls without loading the whole corpus into memory
+        numbered = enumerate(docx_files, 1)
+        pending = deque()
+
+        def submit_next():
+            item = next(numbered, None)
+            if item:
+                i, filepath = item
+                pending.append((i, filepath, pool.submit(self.read_docx, str(filepath))))
+
+        for _ in range(READ_PREFETCH):
+            submit_next()
+
+        current = []
+        current_chars = 0
+        while pending:
+            i, filepath, future = pending.popleft()
+            submit_next()
+
+            label = f"[{i}/{total}]"
+            text = await asyncio.wrap_future(future)
+            if not text:
+                print(f"{label} ⚠️ Empty document or read error: {filepath.name}")
+                unreadable.append(filepath)
+                continue
+
+            if current and current_chars + len(text) > BATCH_CHAR_BUDGET:
+                yield current
+                current = []
+                current_chars = 0
+            current.append((filepath, label, text))
+            current_chars += len(text)
+        if current:
+            yield current
+
+    def ingested_documents(self) -> set:
+        """Return every document name already recorded as a Document node"""
         with self.driver.session() as session:
-            # Adviser
-            if entities.get('adviser'):
-                session.run("MERGE (a:Adviser {name: $name})", name=entities['adviser'])
-            
-            # Clients
-            clients = entities.get('clients', [])
-            if not clients: return
-
-            primary_client_name = clients[0].get('name', f"Unknown_{document_name}")
-
-            for client in clients:
-                props = {k: v for k, v in client.items() if v is not None}
-                props['source_document'] = document_name
-                if 'name' not in props: props['name'] = primary_client_name
-                
-                session.run("""
-                    MERGE (c:Client {name: $name})
-                    SET c += $props
-                    """, name=props['name'], props=props)
-                
-                if entities.get('adviser'):
-                    session.run("""
-                        MATCH (c:Client {name: $c_name}), (a:Adviser {name: $a_name})
-                        MERGE (a)-[:ADVISES]->(c)
-                    """, c_name=props['name'], a_name=entities['adviser'])
-
-            # Dependants
-            for idx, dep in enumerate(entities.get('dependants', [])):
-                dep_id = f"{primary_client_name}_dep_{idx}"
-                session.run("""
-                    MATCH (c:Client {name: $p_name})
-                    MERGE (d:Dependant {id: $id})
-                    SET d += $props
-                    MERGE (c)-[:PARENT_OF]->(d)
-                """, p_name=primary_client_name, id=dep_id, props=dep)
-
-            # Assets (Properties, Pensions, Investments)
-            assets = entities.get('assets', {})
-            
-            for idx, prop in enumerate(assets.get('properties', [])):
-                prop_id = f"{primary_client_name}_prop_{idx}"
-                session.run("""
-                    MATCH (c:Client {name: $c_name})
-                    MERGE (p:Property {id: $id})
-                    SET p += $props
-                    MERGE (c)-[:OWNS]->(p)
-                """, c_name=primary_client_name, id=prop_id, props=prop)
-
-            for idx, pen in enumerate(assets.get('pensions', [])):
-                owner = pen.get('owner', primary_client_name)
-                pen_id = f"{owner}_pen_{idx}"
-                session.run("""
-                    MERGE (c:Client {name: $owner})
-                    MERGE (p:Pension {id: $id})
-                    SET p += $props
-                    MERGE (c)-[:HAS_ACCOUNT]->(p)
-                """, owner=owner, id=pen_id, props=pen)
-
-            for idx, inv in enumerate(assets.get('investments', [])):
-                owner = inv.get('owner', primary_client_name)
-                inv_id = f"{owner}_inv_{idx}"
-                session.run("""
-                    MERGE (c:Client {name: $owner})
-                    MERGE (i:Investment {id: $id})
-                    SET i += $props
-                    MERGE (c)-[:HAS_ACCOUNT]->(i)
-                """, owner=owner, id=inv_id, props=inv)
-
-            # Goals
-            goals = entities.get('goals', {})
-            if goals.get('retirement'):
-                session.run("""
-                    MATCH (c:Client {name: $name})
-                    MERGE (g:Goal {id: $id})
-                    SET g.type='Retirement', g += $props
-                    MERGE (c)-[:HAS_GOAL]->(g)
-                """, name=primary_client_name, id=f"{primary_client_name}_ret_goal", props=goals['retirement'])
-    
-    def process_all_documents(self, documents_dir: str):
-        """Process all Word documents in directory with rate limiting"""
+            result = session.run("MATCH (d:Document) RETURN d.name AS name")
+            return {record['name'] for record in result}
+
+    def mark_documents(self, session, document_names: List[str], status: str):
+        """Record documents that were handled without a graph build (e.g. pre-filtered out)"""
+        session.execute_write(lambda tx: tx.run("""
+            UNWIND $names AS name
+            MERGE (d:Document {name: name})
+            SET d.status = $status
+        """, names=document_names, status=status).consume())
+
+    async def process_all_documents(self, documents_dir: str, force_reprocess: bool = False,
+                                    ignore_cache: bool = False):
+        """Process all Word documents under directory concurrently with rate limiting"""
         documents_path = Path(documents_dir)
-        docx_files = list(documents_path.glob("*.docx"))
-        
-        print(f"\nFound {len(docx_files)} documents to process")
-        print(f"Using Groq Model: llama-3.3-70b-versatile")
-        print(f"Rate Limiting: Sleeping {DELAY_BETWEEN_DOCS_SECONDS}s between docs")
         
         self.create_constraints()
+
+        # Skip documents already in the graph (MERGE would make re-ingesting them a no-op anyway)
+        ingested = set() if force_reprocess else self.ingested_documents()
+
+        def docx_files():
+            # Skip Word's "~$" lock files left next to open documents
+            return (f for f in documents_path.rglob("*.docx")
+                    if not f.name.startswith("~$") and document_name(f, documents_path) not in ingested)
+
+        # Two passes over the directory tree, but the file list is never materialised
+        total = sum(1 for _ in docx_files())
+
+        print(f"\nFound {total} documents to process")
+        if ingested:
+            print("Already-ingested documents are skipped (use --force to reprocess)")
+        print(f"Using Groq Model: {GROQ_MODEL}")
+        print("Rate Limiting: Adaptive, based on Groq x-ratelimit headers")
+        print(f"Concurrency: {MAX_CONCURRENT_DOCS} requests in flight")
         
-        successful = 0
-        failed = 0
-        
-        for i, filepath in enumerate(docx_files, 1):
-            print(f"\n[{i}/{len(docx_files)}] Processing: {filepath.name}")
-            
-            try:
-                # 1. Read
-                text = self.read_docx(str(filepath))
-                if not text:
-                    print("   ⚠️ Empty document or read error")
-                    failed += 1
-                    continue
-                print(f"   ↳ Length: {len(text)} chars")
-
-                # 2. Extract
-                print("   ↳ Extracting with Groq...")
-                entities = self.extract_entities_with_groq(text)
-                
-                if entities:
-                    # 3. Build Graph
-                    self.build_graph_from_entities(entities, filepath.stem)
-                    print("   ✓ Graph updated")
-                    successful += 1
-                else:
-                    print("   ❌ Extraction failed (empty response)")
-                    failed += 1
+        sem = asyncio.Semaphore(MAX_CONCURRENT_DOCS)
+        write_lock = asyncio.Lock()
+        unreadable = []
+        batch_files = []
+        tasks = []
 
-            except Exception as e:
-                print(f"   ❌ Critical error: {e}")
-                failed += 1
-            
-            # Rate Limit Sleep (Skip on last item)
-            if i < len(docx_files):
-                print(f"   zzz Sleeping {DELAY_BETWEEN_DOCS_SECONDS}s to respect Groq limits...")
-                time.sleep(DELAY_BETWEEN_DOCS_SECONDS)
+        # One session for the whole run instead of one per document.
+        # Each batch is dispatched as soon as its docs are read; waiting for a free
+        # slot before dispatching stops reads from running far ahead of extraction.
+        with ThreadPoolExecutor(max_workers=READ_WORKERS) as pool, self.driver.session() as session:
+            async for batch in self._read_batches(docx_files(), total, pool, unreadable):
+                await sem.acquire()
+                batch_files.append([filepath for filepath, _, _ in batch])
+                task = asyncio.create_task(self._process_batch(batch, documents_path, session, write_lock, ignore_cache))
+                task.add_done_callback(lambda _: sem.release())
+                tasks.append(task)
+            results = await asyncio.gather(*tasks, return_exceptions=True)
+
+        successful = 0
+        skipped = 0
+        failed = len(unreadable)
+        for files, result in zip(batch_files, results):
+            if isinstance(result, Exception):
+                names = ", ".join(filepath.name for filepath in files)
+                print(f"   ❌ Critical error in {names}: {result}")
+                failed += len(files)
+            else:
+                batch_successful, batch_skipped = result
+                successful += batch_successful
+                skipped += batch_skipped
+                failed += len(files) - batch_successful - batch_skipped
         
         print(f"\n{'='*60}")
-        print(f"Complete! Success: {successful} | Failed: {failed}")
+        print(f"Complete! Success: {successful} | Skipped: {skipped} | Failed: {failed} | Batches: {len(batch_files)}")
         print(f"{'='*60}")
 
+async def run(documents_dir: str, force_reprocess: bool = False, ignore_cache: bool = False):
+    builder = Neo4jGraphBuilder(NEO4J_URI, NEO4J_USER, NEO4J_PASSWORD)
+    try:
+        await builder.process_all_documents(documents_dir, force_reprocess, ignore_cache)
+    finally:
+        await builder.close()
+
 def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--force', action='store_true',
+                        help="Reprocess documents that are already in the graph")
+    parser.add_argument('--no-cache', action='store_true',
+                        help="Ignore cached Groq responses (fresh results still refresh the cache)")
+    args = parser.parse_args()
+
     # Check env vars
     if not GROQ_API_KEY:
         print("❌ Error: GROQ_API_KEY not found in .env")
@@ -366,11 +906,7 @@ def main():
         return
     
     # Run
-    builder = Neo4jGraphBuilder(NEO4J_URI, NEO4J_USER, NEO4J_PASSWORD)
-    try:
-        builder.process_all_documents(str(documents_dir))
-    finally:
-        builder.close()
+    asyncio.run(run(str(documents_dir), args.force, args.no_cache))
 
 if __name__ == "__main__":
     main()
\ No newline at end of file